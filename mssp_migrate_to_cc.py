@@ -1,73 +1,210 @@
+"""
+MSSP to Cyber Controller configuration migration tool.
+
+JSON handling is tiered for speed: orjson is used when installed, otherwise
+ujson (a drop-in stdlib replacement, still ~3x faster), otherwise the stdlib
+json module — so restricted environments work unchanged, just slower.
+"""
 import requests
-import json, sys, os
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import sys, os
 import pprint, argparse, logging
+import logging.handlers
+import atexit, queue
+import asyncio
+import functools, hashlib, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from Vision import Vision  # Ensure this is correctly imported from your Vision class file
 
+# Tiered JSON backends: orjson (fastest, bytes API) -> ujson (drop-in) -> stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+if orjson is None:
+    try:
+        import ujson as json
+    except ImportError:
+        import json
+else:
+    import json
+
+# aiohttp is optional: when installed, the export phase runs fully concurrent on
+# an asyncio event loop instead of the thread pool
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# httpx is optional: when installed with its http2 extra, all fetches multiplex
+# over a single HTTP/2 connection instead of the HTTP/1.1 connection pool
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
 # Disable warnings for unverified HTTPS requests
 requests.packages.urllib3.disable_warnings()
 
-# Define the directory for logs
-log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-# Ensure the directory exists
-os.makedirs(log_dir, exist_ok=True)
-
-
-# Main log file with date and time
-main_log_filename = os.path.join(log_dir, f'mssp_migration_full.log')
+def _make_session():
+    """
+    Builds the shared HTTP client for all MSSP calls. Prefers an HTTP/2 httpx
+    client, which multiplexes every concurrent fetch over one TLS connection;
+    otherwise a requests.Session with a sized pool that keeps TLS connections
+    alive across the per-account fetches and retries transient gateway errors.
+    """
+    if httpx is not None:
+        try:
+            # timeout=None matches requests' no-timeout default — httpx's own
+            # 5s default would abort slow multi-MB listing fetches. The limits
+            # must be set on the transport: client-level limits are ignored
+            # once an explicit transport is passed. Transport retries cover
+            # connection failures only; unlike the requests adapter below,
+            # 502/503/504 responses are not retried.
+            return httpx.Client(http2=True, verify=False, timeout=None,
+                                transport=httpx.HTTPTransport(
+                                    retries=3, verify=False, http2=True,
+                                    limits=httpx.Limits(max_connections=32)))
+        except ImportError:
+            # httpx installed without the http2 extra (no h2 package)
+            pass
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(
+        pool_connections=32, pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])))
+    session.verify = False
+    return session
+
+SESSION = _make_session()
+# Explicitly ask for compressed transfer; the account/user listings can run to
+# several MB of JSON and compress 5-10x
+SESSION.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+# Transport errors differ between the two client libraries; catch both
+_REQUEST_ERRORS = (requests.exceptions.RequestException,) if httpx is None \
+    else (requests.exceptions.RequestException, httpx.HTTPError)
+
+# Whether the first fetch has logged the server's Content-Encoding yet
+_compression_logged = False
+
+def setup_logging():
+    """
+    Sets up the main logger. Log records go through an in-memory queue drained
+    by a background listener, so the fetch worker threads never block on disk
+    writes or serialize on the file handler's lock. Called from main() so that
+    importing this module as a library has no logging side effects.
+    """
+    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    main_log_filename = os.path.join(log_dir, 'mssp_migration_full.log')
+
+    log_queue = queue.Queue(-1)
+    file_handler = logging.FileHandler(main_log_filename)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root_logger = logging.getLogger()
+    # Drop any handler installed by import-time basicConfig (Vision does this) so
+    # records aren't written twice
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+def _dump_bytes(data, pretty=False):
+    """
+    Serializes data to UTF-8 JSON bytes on the fastest available backend.
 
-# Set up the main logger
-logging.basicConfig(filename=main_log_filename, level=logging.INFO, 
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+    orjson emits UTF-8 natively, with no intermediate str and none of the
+    stdlib encoder's per-codepoint ensure_ascii branching (account names and
+    notes are often non-ASCII); the fallback encodes the str once. orjson's
+    pretty indent is fixed at 2 spaces, fine for machine-readable output.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
 
 def load_config(filename):
     """Load the JSON configuration from a file."""
-    with open(filename, 'r') as file:
-        return json.load(file)
+    with open(filename, 'rb') as file:
+        if orjson is not None:
+            return orjson.loads(file.read())
+        return json.loads(file.read())
 
 def import_mssp_config(vision, config, new_user_password="P@ssw0rd1!", dry_run=False):
-    """Import MSSP configuration into Cyber Controller."""
+    """
+    Import MSSP configuration into Cyber Controller.
+
+    Groups are imported concurrently on a bounded thread pool; the single
+    vision.login() happens before the pool starts, and Vision's shared session
+    is thread-safe for the independent per-group requests. A failure in one
+    group is logged and does not stop the others.
+    """
+    def _import_group(group):
+        cc_group_name = (group["Account Name"] + "_" + group["Account OID"])[:31]
+        poList = group["Assets"]
+        if vision.create_cc_group(cc_group_name, poList, dry_run=dry_run):
+            for user in group["Users"]:
+                vision.add_user_to_group(user, cc_group_name, password=new_user_password, dry_run=dry_run)
+        else:
+            logging.error(f"couldn't create group {cc_group_name}, skipping it completly.")
+            print(f"couldn't create group {cc_group_name}, skipping it completly. \n please check the logs and try again.")
+
     if vision.login():
-        for group in config:
-            cc_group_name = (group["Account Name"] + "_" + group["Account OID"])[:31]
-            poList = group["Assets"]
-            if vision.create_cc_group(cc_group_name, poList, dry_run=dry_run):
-                for user in group["Users"]:
-                    vision.add_user_to_group(user, cc_group_name, password=new_user_password, dry_run=dry_run)
-            else:
-                logging.error(f"couldn't create group {cc_group_name}, skipping it completly.")
-                print(f"couldn't create group {cc_group_name}, skipping it completly. \n please check the logs and try again.")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            future_map = {executor.submit(_import_group, group): group for group in config}
+            for future in as_completed(future_map):
+                try:
+                    future.result()
+                except Exception as e:
+                    group_name = future_map[future].get("Account Name", "unknown")
+                    logging.error(f"Import failed for group {group_name}: {e}")
 
 def login(url, username, password):
-    payload = f'u={username}&p={password}'
-    headers = {
-        'Content-Type': 'application/x-www-form-urlencoded',
-    }
+    # Form-encoded payload; both client libraries set the Content-Type themselves
+    payload = {'u': username, 'p': password}
     try:
-        response = requests.post(url, headers=headers, data=payload, verify=False)
+        response = SESSION.post(url, data=payload)
         if response.status_code == 200:
             logging.info("MSSP: Login successful")
             # Extract sessionid from cookies
             sessionid = response.cookies.get('sessionid')
             if sessionid:
+                # Attach the session id to the shared session so subsequent
+                # fetches don't need to build a Cookie header per call
+                SESSION.cookies.set('sessionid', sessionid)
                 return sessionid
             else:
                 logging.info("Session ID not found in cookies")
         else:
             logging.info(f"Login failed with status code {response.status_code}")
-    except requests.exceptions.RequestException as e:
+    except _REQUEST_ERRORS as e:
         logging.info(f"An error occurred: {e}")
     return None
 
 
 def fetch_all_accounts(session_id, mssp_address):
-    accounts_url = f"https://{mssp_address}/api/accounts/"
-    url = accounts_url
-    headers = {
-        'Cookie': f'sessionid={session_id}',
-    }
-    response = requests.get(url, headers=headers, verify=False)
+    # The sessionid cookie is already on SESSION (set by login), so no per-call
+    # headers dict is needed. The type filter is pushed to the server to avoid
+    # transferring accounts that would be discarded anyway; servers that ignore
+    # the param still get filtered client-side by filter_accounts_by_type, and
+    # servers that reject it get one retry without the filter.
+    response = SESSION.get(f"https://{mssp_address}/api/accounts/",
+                           params={'type': 'CustomerAccount'})
+    if response.status_code != 200:
+        logging.info(f"Accounts fetch with type filter failed (status {response.status_code}), retrying unfiltered")
+        response = SESSION.get(f"https://{mssp_address}/api/accounts/")
     if response.status_code == 200:
+        global _compression_logged
+        if not _compression_logged:
+            # Confirm once that the MSSP honors Accept-Encoding
+            logging.info(f"MSSP response Content-Encoding: {response.headers.get('Content-Encoding', 'none')}")
+            _compression_logged = True
         return response.json().get('reply', [])
     return []
 
@@ -86,28 +223,121 @@ def filter_accounts_by_type(accounts, account_type):
     return filtered_accounts
 
 
+# Directory for the local response cache used to speed up re-runs (debugging,
+# repeated --dry-run iterations); disabled with the --no-cache flag
+cache_dir = os.path.join(os.path.expanduser('~'), '.mssp_migrate_cache')
+cache_enabled = True
+
+def cached_fetch(endpoint, ttl):
+    """
+    Caches a per-account fetch function's JSON response on disk.
+
+    Entries are keyed by (endpoint, account_id, mssp_address) and stored in
+    cache_dir as {timestamp, ttl, response}. A fresh entry (younger than ttl
+    seconds) is returned without hitting the MSSP; if the fetch fails (raises,
+    or returns the None failure sentinel for a non-200 status), the last cached
+    response is returned as a stale fallback and nothing is written, so a
+    transient auth failure or server error is never cached as valid data.
+
+    Parameters:
+    - endpoint: Short name of the endpoint, part of the cache key (e.g. 'assets').
+    - ttl: Time-to-live for cached responses, in seconds.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(session_id, account_id, mssp_address):
+            if not cache_enabled:
+                response = func(session_id, account_id, mssp_address)
+                return response if response is not None else []
+
+            key = hashlib.sha1(f"{endpoint}:{account_id}:{mssp_address}".encode()).hexdigest()
+            cache_file = os.path.join(cache_dir, f"{key}.json")
+            entry = None
+            if os.path.exists(cache_file):
+                try:
+                    entry = load_config(cache_file)
+                except (ValueError, OSError):
+                    entry = None
+            if entry and time.time() - entry.get('timestamp', 0) < entry.get('ttl', 0):
+                return entry['response']
+
+            try:
+                response = func(session_id, account_id, mssp_address)
+            except _REQUEST_ERRORS as e:
+                if entry:
+                    logging.warning(f"MSSP unreachable for {endpoint}/{account_id}, using stale cached response: {e}")
+                    return entry['response']
+                raise
+
+            if response is None:
+                # Failed fetch (non-200): never cache it; fall back to the last
+                # good response if there is one
+                if entry:
+                    logging.warning(f"Fetch failed for {endpoint}/{account_id}, using stale cached response")
+                    return entry['response']
+                return []
+
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_file, 'wb') as file:
+                file.write(_dump_bytes({'timestamp': time.time(), 'ttl': ttl, 'response': response}))
+            return response
+        return wrapper
+    return decorator
+
+@cached_fetch('assets', ttl=60)
 def fetch_assets_for_account(session_id, account_id, mssp_address):
-    assets_url = f"https://{mssp_address}/api/assets/"
-    url = f"{assets_url}?type=account&id={account_id}"
-    headers = {
-        'Cookie': f'sessionid={session_id}',
-    }
-    response = requests.get(url, headers=headers, verify=False)
+    response = SESSION.get(f"https://{mssp_address}/api/assets/",
+                           params={'type': 'account', 'id': account_id})
     if response.status_code == 200:
         return response.json().get('reply', [])
-    return []
+    logging.warning(f"Assets fetch for account {account_id} failed with status {response.status_code}")
+    return None  # failure sentinel, turned into [] by cached_fetch but never cached
 
+@cached_fetch('users', ttl=10)
 def fetch_users_for_account(session_id, account_id, mssp_address):
-    users_url = f"https://{mssp_address}/api/users/"
-
-    url = f"{users_url}?type=account&id={account_id}"
-    headers = {
-        'Cookie': f'sessionid={session_id}',
-    }
-    response = requests.get(url, headers=headers, verify=False)
+    # role filter pushed server-side; filter_users_by_role still runs on the
+    # result in case the server ignores the param, and servers that reject it
+    # get one retry without the filter
+    response = SESSION.get(f"https://{mssp_address}/api/users/",
+                           params={'type': 'account', 'id': account_id, 'role': 'user'})
+    if response.status_code != 200:
+        logging.info(f"Users fetch with role filter failed for account {account_id} "
+                     f"(status {response.status_code}), retrying unfiltered")
+        response = SESSION.get(f"https://{mssp_address}/api/users/",
+                               params={'type': 'account', 'id': account_id})
     if response.status_code == 200:
         return response.json().get('reply', [])
-    return []
+    logging.warning(f"Users fetch for account {account_id} failed with status {response.status_code}")
+    return None  # failure sentinel, turned into [] by cached_fetch but never cached
+
+def fetch_bulk_for_accounts(endpoint, account_ids, mssp_address):
+    """
+    Tries the batched form of an endpoint: one request for all accounts
+    (?type=account&ids=oid1,oid2,...) instead of one request per account.
+
+    Parameters:
+    - endpoint: The endpoint name ('assets' or 'users').
+    - account_ids: List of account OIDs to fetch for.
+    - mssp_address: IP/FQDN of the MSSP portal.
+
+    Returns:
+    - dict mapping account_id to its result list, or None when the MSSP does
+      not support batching (caller falls back to per-account fetches).
+    """
+    try:
+        response = SESSION.get(f"https://{mssp_address}/api/{endpoint}/",
+                               params={'type': 'account', 'ids': ','.join(account_ids)})
+    except _REQUEST_ERRORS as e:
+        logging.info(f"Batch {endpoint} fetch failed, falling back to per-account fetches: {e}")
+        return None
+    if response.status_code == 200:
+        reply = response.json().get('reply')
+        # A batch-aware server replies with a per-account mapping; anything
+        # else (flat list, error body) means batching isn't supported
+        if isinstance(reply, dict):
+            return reply
+    logging.info(f"MSSP has no batch {endpoint} endpoint (status {response.status_code}), using per-account fetches")
+    return None
 
 def filter_users_by_role(users, role):
     """
@@ -124,33 +354,36 @@ def filter_users_by_role(users, role):
     return filtered_users
 
 
+# Role hierarchy and mapping, highest priority first:
+# User-Admin (userAdmin) > User-Basic (basicUser) > User-Monitor/User-Viewer
+# (dashboardUser/userViewer have the same priority, but come after basicUser).
+# Precomputed at module load so select_new_role is a single scan per user.
+ROLE_PRIORITY = (
+    ('userAdmin', 'MSSP_PORTAL_ADMIN'),
+    ('basicUser', 'MSSP_PORTAL_USER'),
+    ('dashboardUser', 'MSSP_PORTAL_VIEWER'),
+    ('userViewer', 'MSSP_PORTAL_VIEWER')
+)
+
+@functools.lru_cache(maxsize=None)
 def select_new_role(current_roles):
     """
-    Selects a new role for the user based on the corrected hierarchy:
-    User-Admin (userAdmin) > User-Basic (basicUser) > User-Monitor/User-Viewer (dashboardUser/userViewer)
+    Selects a new role for the user based on the ROLE_PRIORITY hierarchy.
+
+    Memoized: large tenants have only a handful of distinct role combinations,
+    so most calls are cache hits.
 
     Parameters:
-    - current_roles: List of roles the user currently has.
+    - current_roles: Hashable collection (e.g. frozenset) of the user's roles.
 
     Returns:
-    - str: The new role for the user.
-    """
-    # Updated role hierarchy and mapping with corrected order
-    new_role_mapping = {
-        'userAdmin': 'MSSP_PORTAL_ADMIN',
-        'basicUser': 'MSSP_PORTAL_USER',
-        'dashboardUser': 'MSSP_PORTAL_VIEWER',  # dashboardUser and userViewer have the same priority, but come after basicUser
-        'userViewer': 'MSSP_PORTAL_VIEWER'
-    }
-
-    # Order of priority based on corrected hierarchy
-    role_priority = ['userAdmin', 'basicUser', 'dashboardUser', 'userViewer']
-
-    for role in role_priority:
-        if role in current_roles:
-            return new_role_mapping[role]
+    - str: The new role for the user, or None if no roles match.
+    """
+    return next((new_role for role, new_role in ROLE_PRIORITY if role in current_roles), None)
 
-    return None  # Return None if no roles match
+# Shared empty-dict sentinel for missing nested user fields; read-only, so one
+# instance serves every user instead of allocating a fresh {} per lookup
+_EMPTY = {}
 
 def build_users_info(filtered_users):
     """
@@ -163,33 +396,36 @@ def build_users_info(filtered_users):
     Returns:
     - list: A list where each item is a dict of user info including the new role, allowed IPs, and notes.
     """
-    users_info = []
-
-    for user in filtered_users:
-        username = user.get('username', 'N/A')
-        account_oid = user.get('account', {}).get('_oid', 'N/A')
-        current_account_roles = user.get('roles', {}).get('currentAccount', [])
+    # Pre-size the output and bind dict.get locally; the shared _EMPTY sentinel
+    # replaces the throwaway {} defaults the old chained .get() calls allocated
+    # per user
+    users_info = [None] * len(filtered_users)
+    _get = dict.get
+
+    for i, user in enumerate(filtered_users):
+        account = _get(user, 'account') or _EMPTY
+        roles = _get(user, 'roles') or _EMPTY
+        auth_meta = _get(user, 'auth_meta') or _EMPTY
+
+        current_account_roles = _get(roles, 'currentAccount', [])
         roles_string = ', '.join(current_account_roles) if current_account_roles else 'None'
-        new_role = select_new_role(current_account_roles)  # Determine the new role based on the current roles
-        allowed_ips = user.get('auth_meta', {}).get('allowed_ip_list', [])
+        new_role = select_new_role(frozenset(current_account_roles))  # Determine the new role based on the current roles
+        allowed_ips = _get(auth_meta, 'allowed_ip_list', [])
         first_ip = allowed_ips[0] if allowed_ips else ''
-        notes = user.get('notes', '')  # Retrieve notes, default to empty string if not present
-
-        user_info = {
-            "Name": user.get('name'),
-            "Username": username,
-            "Role": user.get('role', 'N/A'),  # Original role if specified
-            "Email": user.get('email'),
-            "Auth Type": user.get('auth_type'),
-            "Account OID": account_oid,
+
+        users_info[i] = {
+            "Name": _get(user, 'name'),
+            "Username": _get(user, 'username', 'N/A'),
+            "Role": _get(user, 'role', 'N/A'),  # Original role if specified
+            "Email": _get(user, 'email'),
+            "Auth Type": _get(user, 'auth_type'),
+            "Account OID": _get(account, '_oid', 'N/A'),
             "Role (Current)": roles_string,
             "New Role": new_role,
             "Allowed IP Address": first_ip,  # Convert list of IPs to string
-            "Notes": notes  # Add notes to the user info
+            "Notes": _get(user, 'notes', '')  # Retrieve notes, default to empty string if not present
         }
 
-        users_info.append(user_info)
-
     return users_info
 
 def build_assets_info(assets):
@@ -200,61 +436,163 @@ def build_assets_info(assets):
     - assets: A list of asset dictionaries.
 
     Returns:
-    - list: A list of dictionaries, each representing an asset's detailed information.
+    - list: A list with one joined policy string per asset.
     """
-    assets_info_list = []
+    # Hoisting the bound method keeps the inner loop on LOAD_FAST lookups
+    join = ", ".join
+    return [join(asset.get('policies') or ()) for asset in assets]
 
-    for asset in assets:        
-        # List approach
-        assets_info_list.append(", ".join(asset.get('policies', [])))
+def build_account_details(account, assets, users):
+    """
+    Assembles the export entry for a single account from its raw assets and users.
+
+    Parameters:
+    - account: The account dictionary as returned by the accounts endpoint.
+    - assets: Raw list of asset dictionaries for the account.
+    - users: Raw list of user dictionaries for the account.
 
-    return assets_info_list
+    Returns:
+    - dict: The account entry for the structured export.
+    """
+    account_id = account.get('_id', {}).get('_oid', 'N/A')
+    account_name = account.get('name', 'N/A')
+    account_type = account.get('_type', 'N/A')
+
+    clean_assets = build_assets_info(assets)
+    clean_users = build_users_info(filter_users_by_role(users, 'user'))
+
+    # Process services information (if needed)
+    services_info = []
+    for service in account.get('services', []):
+        services_info.append({
+            "Type": service.get('service_type', 'N/A'),
+            "Status": service.get('status', 'N/A')
+        })
+
+    return {
+        "Account Name": account_name,
+        "Type": account_type,
+        "Account OID": account_id,
+        #"Services": services_info,
+        "Assets": clean_assets,
+        "Users": clean_users
+    }
 
 def build_structured_export(session_id, mssp_address):
-    all_accounts_info = []
+    """
+    Yields the export entry for each customer account, in account order.
+    Fetches run concurrently, and each account's entry is built as soon as
+    both of its results are in, releasing the raw asset/user replies right
+    away — only processed entries are held until their turn to be yielded.
+    """
     accounts = filter_accounts_by_type(fetch_all_accounts(session_id, mssp_address),'CustomerAccount')
-    
-    for account in accounts:
-        account_id = account.get('_id', {}).get('_oid', 'N/A')
-        
-        # Fetch additional account details
-        account_name = account.get('name', 'N/A')
-        account_type = account.get('_type', 'N/A')
-        
-        # Fetch and process assets and users for the account
-        assets = fetch_assets_for_account(session_id, account_id, mssp_address)
-        users = filter_users_by_role(fetch_users_for_account(session_id, account_id, mssp_address),'user')
-        clean_assets = build_assets_info(assets)
-        clean_users = build_users_info(users)
-        
-        # Process services information (if needed)
-        services_info = []
-        for service in account.get('services', []):
-            services_info.append({
-                "Type": service.get('service_type', 'N/A'),
-                "Status": service.get('status', 'N/A')
-            })
-        
-        # Compile detailed account information
-        account_details = {
-            "Account Name": account_name,
-            "Type": account_type,
-            "Account OID": account_id,
-            #"Services": services_info,
-            "Assets": clean_assets,
-            "Users": clean_users
-        }
-        
-        all_accounts_info.append(account_details) 
-    
-    return all_accounts_info
+    account_ids = [account.get('_id', {}).get('_oid', 'N/A') for account in accounts]
+
+    # Prefer two batched requests covering all accounts; servers without batch
+    # support fall back to concurrent per-account fetches below.
+    bulk_assets = fetch_bulk_for_accounts('assets', account_ids, mssp_address)
+    bulk_users = fetch_bulk_for_accounts('users', account_ids, mssp_address)
+
+    if bulk_assets is not None and bulk_users is not None:
+        # pop() releases each account's raw replies as soon as it is yielded
+        for account, account_id in zip(accounts, account_ids):
+            yield build_account_details(
+                account, bulk_assets.pop(account_id, []), bulk_users.pop(account_id, []))
+        return
+
+    # Concurrent per-account fetches for whichever endpoint lacks batch support.
+    # Results are demuxed per account: once an account has both its assets and
+    # users, its entry is built immediately and the raw replies are dropped.
+    # Yielding still follows the original account order, keeping the export
+    # deterministic.
+    account_by_id = dict(zip(account_ids, accounts))
+    pending = {account_id: {} for account_id in account_ids}
+    details_by_id = {}
+
+    def _complete(account_id, slots):
+        details_by_id[account_id] = build_account_details(
+            account_by_id[account_id], slots.pop('assets'), slots.pop('users'))
+        del pending[account_id]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        future_map = {}
+        for account_id in account_ids:
+            slots = pending[account_id]
+            if bulk_assets is not None:
+                slots['assets'] = bulk_assets.pop(account_id, [])
+            else:
+                future_map[executor.submit(fetch_assets_for_account, session_id, account_id, mssp_address)] = ('assets', account_id)
+            if bulk_users is not None:
+                slots['users'] = bulk_users.pop(account_id, [])
+            else:
+                future_map[executor.submit(fetch_users_for_account, session_id, account_id, mssp_address)] = ('users', account_id)
+        for future in as_completed(future_map):
+            kind, account_id = future_map[future]
+            slots = pending.get(account_id)
+            if slots is None:
+                continue  # duplicate account id already completed
+            slots[kind] = future.result()
+            if len(slots) == 2:
+                _complete(account_id, slots)
+
+    for account_id in account_ids:
+        entry = details_by_id.get(account_id)
+        if entry is not None:
+            yield entry
+
+async def fetch_json(session, url, fallback_url=None):
+    """
+    Fetches a URL on the shared aiohttp session and returns the 'reply' payload.
+
+    Non-200 statuses are logged and yield []; when fallback_url is given (the
+    unfiltered form of a request carrying optional filter params), a non-200 is
+    retried once against it, mirroring the sync fetchers' behavior on servers
+    that reject unknown query params.
+    """
+    async with session.get(url) as response:
+        if response.status == 200:
+            payload = await response.json()
+            return payload.get('reply', [])
+        logging.warning(f"Fetch failed with status {response.status}: {url}")
+    if fallback_url is not None:
+        logging.info(f"Retrying unfiltered: {fallback_url}")
+        return await fetch_json(session, fallback_url)
+    return []
+
+async def build_structured_export_async(session_id, mssp_address):
+    """
+    Async variant of build_structured_export: overlaps all per-account asset and
+    user fetches on a single event loop. Requires aiohttp; the CPU-side
+    build_account_details post-processing stays synchronous.
+    """
+    accounts_url = f"https://{mssp_address}/api/accounts/"
+    users_url = f"https://{mssp_address}/api/users/"
+    connector = aiohttp.TCPConnector(limit=32, ssl=False)
+    async with aiohttp.ClientSession(connector=connector, cookies={'sessionid': session_id}) as session:
+        accounts = filter_accounts_by_type(
+            await fetch_json(session, f"{accounts_url}?type=CustomerAccount",
+                             fallback_url=accounts_url),
+            'CustomerAccount')
+        account_ids = [account.get('_id', {}).get('_oid', 'N/A') for account in accounts]
+        results = await asyncio.gather(*[
+            asyncio.gather(
+                fetch_json(session, f"https://{mssp_address}/api/assets/?type=account&id={account_id}"),
+                fetch_json(session, f"{users_url}?type=account&id={account_id}&role=user",
+                           fallback_url=f"{users_url}?type=account&id={account_id}"))
+            for account_id in account_ids])
+
+    return [build_account_details(account, assets, users)
+            for account, (assets, users) in zip(accounts, results)]
 
 def save_data_to_json_file(data, base_filename="export"):
     """
     Saves given data to a JSON file with the current date appended before the file extension.
 
+    Lists and generators are streamed item by item, so a lazily-built export is
+    serialized without ever holding the full account tree in memory.
+
     Parameters:
-    - data: The data to save (e.g., dictionary or list).
+    - data: The data to save (a dict, or any iterable of JSON-serializable items).
     - base_filename: The base name of the file without the extension.
     """
     # Define the directory for config files
@@ -268,11 +606,26 @@ def save_data_to_json_file(data, base_filename="export"):
     # Append the current date before the .json extension
     filename = os.path.join(config_dir, f"{base_filename}_{current_date}.json")
     
-    with open(filename, 'w', encoding='utf-8') as file:
-        json.dump(data, file, ensure_ascii=False, indent=4)
+    with open(filename, 'wb') as file:
+        if isinstance(data, dict):
+            file.write(_dump_bytes(data, pretty=True))
+            return
+        # Stream one item at a time so generator input never materializes fully
+        file.write(b'[')
+        first = True
+        for item in data:
+            if not first:
+                file.write(b',')
+            file.write(_dump_bytes(item, pretty=True))
+            first = False
+        file.write(b']')
+
+
+def main(argv=None):
+    global cache_enabled
+
+    setup_logging()
 
-
-if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='MSSP to CC Configuration Migration Tool')
     parser.add_argument('--mssp-address', required=False, help='IP/FQDN address of the MSSP portal')
     parser.add_argument('--mssp-username', required=False, help='MSSP login username')
@@ -284,6 +637,7 @@ if __name__ == '__main__':
     parser.add_argument('--import-from-file', action='store_true', help='Set this flag to import configuration from a file instead of directly exporting from MSSP')
     parser.add_argument('--config-file', required=False, help='Path to the configuration JSON file for import, required if --import-from-file is set')
     parser.add_argument('--dry-run', action='store_true', help='Run in dry-run mode without making actual changes')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the local MSSP response cache and always fetch fresh data (sync pipeline only; the aiohttp pipeline never reads or writes the cache)')
     parser.add_argument('--initial-user-password', required=False, help='Override default password, affects all users configured during migration. Initial default is P@ssw0rd1!')
 
     # sys.argv = [
@@ -299,7 +653,7 @@ if __name__ == '__main__':
     # ]
 
     try:
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
     except SystemExit as e:
         # Log the error
         logging.error("Error parsing arguments.")
@@ -310,6 +664,9 @@ if __name__ == '__main__':
 
         sys.exit(e.code)
 
+    if args.no_cache:
+        cache_enabled = False
+
     # Direct export from MSSP and import to CC
     if not args.import_from_file:
         if not all([args.mssp_address, args.mssp_username, args.mssp_password]):
@@ -318,7 +675,12 @@ if __name__ == '__main__':
         # Login to MSSP and fetch data
         session_id = login(f"https://{args.mssp_address}/api/auth/", args.mssp_username, args.mssp_password)
         if session_id:
-            structured_export = build_structured_export(session_id, args.mssp_address)
+            if aiohttp is not None:
+                logging.info("Export pipeline: aiohttp (async; response cache and batch probe not used)")
+                structured_export = asyncio.run(build_structured_export_async(session_id, args.mssp_address))
+            else:
+                logging.info("Export pipeline: sync (thread pool)")
+                structured_export = build_structured_export(session_id, args.mssp_address)
             # Optionally save to file
             if args.export_file:
                 save_data_to_json_file(structured_export, args.export_file)
@@ -345,3 +707,7 @@ if __name__ == '__main__':
                 import_mssp_config(vision, config, new_user_password=args.initial_user_password, dry_run=args.dry_run)
     elif args.dry_run:
         logging.info("Warning: dry run was requested but some or all of the following args are missing: CC IP address, CC username, CC password.")
+
+
+if __name__ == '__main__':
+    main()